@@ -1 +1,2 @@
-from ctxt.ctxt import StackTracerException, Tracer, __doc__
+from ctxt.ctxt import StackTracerException, Tracer, TracerStats, __doc__
+from ctxt.log import LogContext, ContextFilter, ContextFormatter
@@ -80,9 +80,11 @@ Todo:
 
 
 import re
+import sys
 import inspect
 import traceback
 import functools
+import threading
 import collections
 from contextlib import contextmanager
 
@@ -95,6 +97,16 @@ except ImportError:
     except ImportError:
         pass
 
+try:
+    from inspect import getfullargspec as getargspec
+except ImportError:
+    from inspect import getargspec
+
+try:
+    from time import perf_counter as timer
+except ImportError:
+    from time import time as timer
+
 
 class StackTracerException(Exception):
     """ StackTracerException - class containing semantic exception context
@@ -111,16 +123,43 @@ class StackTracerException(Exception):
         - when upper stack frame catches underlying StackTracerException newly
           generated StackTracerException will contain reference to it and
           possibly som textual description
+        - when upper stack frame repeats the template and function of
+          underlying StackTracerException (i.e. recursion) several frames may
+          be folded into one run record. It keeps texts of the first and the
+          last folded frames and the number of frames folded
     """
 
-    def __init__(self, sub_exc=None, text=None, params_map=None):
+    def __init__(self, sub_exc=None, text=None, params_map=None, key=None,
+                 streak=1, run_first=None, repeats=0):
         self.__sub_exc = sub_exc
         self.__text = text
         self.__params_map = {} if params_map is None else params_map
+        self.__key = key
+        self.__streak = streak
+        self.__repeats = repeats
+        self.__run_first = run_first
 
     def params(self):
         return self.__params_map
 
+    def key(self):
+        return self.__key
+
+    def streak(self):
+        return self.__streak
+
+    def sub_exc(self):
+        return self.__sub_exc
+
+    def run_first(self):
+        return self.__run_first
+
+    def repeats(self):
+        return self.__repeats
+
+    def text(self):
+        return self.__text
+
     def format(self, fmt):
         """ format exception to some human or machine readable format depending
         on fmt option
@@ -139,15 +178,22 @@ class StackTracerException(Exception):
                   always has this field containing original python traceback.
                 - sub_exc - reference to lower frame object. Is present for all
                   frames except the lowest one.
+                - run - present for folded recursive frames only. Contains
+                  `first` and `last` texts of folded frames and `count` of
+                  frames folded. `text` field equals to `last` in this case.
         """
 
         assert fmt in ['dict', 'dict-short']
         s = {}
-        if self.__text:
-            if self.__params_map:
-                s['text'] = self.__text.format(**self.__params_map)
-            else:
-                s['text'] = self.__text
+        text = self.text()
+        if text:
+            s['text'] = text
+        if self.__repeats:
+            s['run'] = {
+                'first': self.__run_first,
+                'last': text,
+                'count': self.__repeats,
+            }
         if self.__sub_exc:
             s['sub_exc'] = self.__sub_exc.format('dict')
         return s
@@ -156,6 +202,143 @@ class StackTracerException(Exception):
         return str(self.format('dict'))
 
 
+class TracerStats(object):
+    """ TracerStats - counters of ctxt own exception handling overhead
+
+    TracerStats collects per template counters when attached to Tracer either
+    with `stats` constructor argument or `stats` subclass attribute. Nothing is
+    collected for Tracers without stats, so instrumentation is opt-in.
+
+    Counters kept for each template:
+        - captures - number of original exceptions captured
+        - levels - number of chain levels built
+        - capture_time - seconds spent formatting original traceback
+        - lookup_time - seconds spent looking up template values in
+          arguments and call stack
+        - format_time - seconds spent formatting template text
+        - raise_time - seconds spent constructing StackTracerException or
+          annotating original exception
+
+    Scopes without text are counted under `no_template` label.
+
+    Example:
+        >> stats = TracerStats()
+        >> tracer = Tracer(stats=stats)
+        >> ...
+        >> export(stats.snapshot(reset=True))
+    """
+
+    fields = (
+        'captures', 'levels',
+        'capture_time', 'lookup_time', 'format_time', 'raise_time',
+    )
+    no_template = '<scope>'
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__counters = {}
+
+    def add(self, template, **values):
+        """add - increment template counters by values provided"""
+        if template is None:
+            template = self.no_template
+        with self.__lock:
+            counters = self.__counters.get(template)
+            if counters is None:
+                counters = dict.fromkeys(self.fields, 0)
+                self.__counters[template] = counters
+            for k, v in values.items():
+                counters[k] += v
+
+    def snapshot(self, reset=False):
+        """snapshot - copy of collected counters
+
+        Args:
+            reset (bool, optional): atomically reset counters after copying
+
+        Returns:
+            dict mapping template to dict of its counters
+        """
+        with self.__lock:
+            s = {k: dict(v) for k, v in self.__counters.items()}
+            if reset:
+                self.__counters = {}
+        return s
+
+    def reset(self):
+        """reset - drop all collected counters"""
+        with self.__lock:
+            self.__counters = {}
+
+
+class AnnotatedFrame(collections.namedtuple(
+    'AnnotatedFrame', 'text params key streak run_first repeats'
+)):
+    """ AnnotatedFrame - stack frame description attached to original exception
+
+    Used by Tracer in annotate mode in place of StackTracerException. Fields
+    match StackTracerException ones, text is stored already formatted.
+    """
+
+    __slots__ = ()
+
+    def note(self):
+        if self.repeats:
+            return Tracer.format_run(
+                first=self.run_first, last=self.text, count=self.repeats
+            )
+        return self.text
+
+    def format(self, sub_exc):
+        s = {}
+        if self.text:
+            s['text'] = self.text
+        if self.repeats:
+            s['run'] = {
+                'first': self.run_first,
+                'last': self.text,
+                'count': self.repeats,
+            }
+        s['sub_exc'] = sub_exc
+        return s
+
+
+class Stopwatch(object):
+    """ Stopwatch - times exception handling phases for TracerStats
+
+    Stopwatch started without stats is shared `off` instance doing nothing,
+    so no timer is called while instrumentation is off.
+    """
+
+    def __init__(self, stats=None, template=None):
+        self.__stats = stats
+        self.__template = template
+        self.__values = {}
+        self.__last = None if stats is None else timer()
+
+    @classmethod
+    def start(cls, stats, template):
+        return cls.off if stats is None else cls(stats, template)
+
+    def lap(self, field):
+        """lap - account time passed since previous lap to field"""
+        if self.__stats is None:
+            return
+        now = timer()
+        self.__values[field] = now - self.__last
+        self.__last = now
+
+    def stop(self, **values):
+        """stop - add laps and values provided to stats"""
+        if self.__stats is None:
+            return
+        values.update(self.__values)
+        self.__stats.add(self.__template, **values)
+
+
+Stopwatch.off = Stopwatch()
+
+
 class Tracer(object):
     """Tracer  - provides context managers and decorators to trace semantics
     of method call stack.
@@ -176,6 +359,22 @@ class Tracer(object):
             reraised without additional processing. If `throws` attribute is
             decided to be used, its better to subclass Tracer and define this
             attribute in subclass only
+        keep_repeats (int, optional): optional number of consecutive frames
+            with the same template and function (i.e. recursive calls) kept in
+            full. Two or more further repeating frames are folded into single
+            run record when exception is captured, scopes are told apart by
+            the function using them. Compression is disabled when missing or
+            None. The first frame is always kept in full, so 0 acts as 1
+        stats (TracerStats, optional): optional counters of exception
+            handling overhead. Nothing is collected when missing or None
+        annotate (bool, optional): when True original exception is not
+            wrapped with StackTracerException. Each stack frame appends its
+            text to original exception notes (Python 3.11+) and to side
+            record readable with `format_chain`, then the very same
+            exception is reraised. Exception type based handling keeps
+            working and no wrappers are allocated. StackTracerException from
+            lower frames is wrapped as usual. Tracers not annotating wrap
+            annotated exception with StackTracerException carrying its frames
 
     Note:
         `throws` attribute is expected to be used for static class methods only.
@@ -183,16 +382,32 @@ class Tracer(object):
         expected exceptions while constructing it
     """
 
-    def __init__(self, throws=None):
+    def __init__(self, throws=None, keep_repeats=None, stats=None,
+                 annotate=None):
         """Construct new Tracer instance.
 
         Args:
             throws (tuple of Exceptions, optional): optional tuple with
                 exceptions to ignore. When exception from this tuple occures its
                 ignored and reraised for further caller processing
+            keep_repeats (int, optional): number of consecutive repeating
+                frames kept in full before folding them into run record, 0
+                acts as 1. Overrides `keep_repeats` class attribute
+            stats (TracerStats, optional): counters of exception handling
+                overhead. Overrides `stats` class attribute
+            annotate (bool, optional): annotate original exception in place
+                instead of wrapping it. Overrides `annotate` class attribute
         """
 
         self.__throws = () if throws is None else tuple(throws)
+        self.__keep_repeats = (
+            getattr(self, 'keep_repeats', None)
+            if keep_repeats is None else keep_repeats
+        )
+        self.__stats = getattr(self, 'stats', None) if stats is None else stats
+        self.__annotate = (
+            getattr(self, 'annotate', False) if annotate is None else annotate
+        )
         self.traced = self.__traced_inst
         self.scope = self.__scope_inst
 
@@ -258,13 +473,18 @@ class Tracer(object):
 
                 try:
                     return f(*args, **kwargs)
-                except StackTracerException as e:
-                    Tracer.mk_traced_exc(e, text_spec, f, args, kwargs)
                 except Exception as e:
-                    if throws(e):
+                    keep_repeats, stats, annotate = Tracer.cls_options(cls)
+                    if not Tracer.continues_chain(e, annotate):
+                        if throws(e):
+                            raise
+                        e = Tracer.capture_exc(e, text_spec, stats, annotate)
+                    exc = Tracer.mk_traced_exc(
+                        e, text_spec, f, args, kwargs, keep_repeats, stats
+                    )
+                    if exc is None:
                         raise
-                    e = StackTracerException(text=traceback.format_exc())
-                    Tracer.mk_traced_exc(e, text_spec, f, args, kwargs)
+                    raise exc
             return wrapped_f
         return wrap
 
@@ -282,13 +502,20 @@ class Tracer(object):
 
                 try:
                     return f(*args, **kwargs)
-                except StackTracerException as e:
-                    Tracer.mk_traced_exc(e, text_spec, f, args, kwargs)
                 except Exception as e:
-                    if throws(e):
+                    if not Tracer.continues_chain(e, self.__annotate):
+                        if throws(e):
+                            raise
+                        e = Tracer.capture_exc(
+                            e, text_spec, self.__stats, self.__annotate
+                        )
+                    exc = Tracer.mk_traced_exc(
+                        e, text_spec, f, args, kwargs,
+                        self.__keep_repeats, self.__stats
+                    )
+                    if exc is None:
                         raise
-                    e = StackTracerException(text=traceback.format_exc())
-                    Tracer.mk_traced_exc(e, text_spec, f, args, kwargs)
+                    raise exc
             return wrapped_f
         return wrap
 
@@ -345,13 +572,18 @@ class Tracer(object):
 
         try:
             yield
-        except StackTracerException as e:
-            Tracer.mk_scope_exc(e, args)
         except Exception as e:
-            if throws(e):
+            keep_repeats, stats, annotate = Tracer.cls_options(cls)
+            if not Tracer.continues_chain(e, annotate):
+                if throws(e):
+                    raise
+                e = Tracer.capture_exc(
+                    e, Tracer.parse_args(args)[0], stats, annotate
+                )
+            exc = Tracer.mk_scope_exc(e, args, keep_repeats, stats)
+            if exc is None:
                 raise
-            exc_wrapper = StackTracerException(text=traceback.format_exc())
-            Tracer.mk_scope_exc(exc_wrapper, args)
+            raise exc
 
     @contextmanager
     def __scope_inst(self, *args):
@@ -367,13 +599,45 @@ class Tracer(object):
 
         try:
             yield
-        except StackTracerException as e:
-            Tracer.mk_scope_exc(e, args)
         except Exception as e:
-            if throws(e):
+            if not Tracer.continues_chain(e, self.__annotate):
+                if throws(e):
+                    raise
+                e = Tracer.capture_exc(
+                    e, Tracer.parse_args(args)[0],
+                    self.__stats, self.__annotate
+                )
+            exc = Tracer.mk_scope_exc(
+                e, args, self.__keep_repeats, self.__stats
+            )
+            if exc is None:
                 raise
-            exc_wrapper = StackTracerException(text=traceback.format_exc())
-            Tracer.mk_scope_exc(exc_wrapper, args)
+            raise exc
+
+    @staticmethod
+    def cls_options(cls):
+        return (
+            getattr(cls, 'keep_repeats', None),
+            getattr(cls, 'stats', None),
+            getattr(cls, 'annotate', False),
+        )
+
+    @staticmethod
+    def scope_owner():
+        """scope_owner - module and qualified name of code using scope
+
+        Expected to be called while scope handles exception. Scope generator
+        frame is the first one of the traceback, the code with scope block is
+        the next one.
+        """
+        tb = sys.exc_info()[2]
+        if tb is None or tb.tb_next is None:
+            return None, None
+        frame = tb.tb_next.tb_frame
+        return (
+            frame.f_globals.get('__name__'),
+            getattr(frame.f_code, 'co_qualname', frame.f_code.co_name)
+        )
 
     @staticmethod
     def parse_args(args):
@@ -396,7 +660,7 @@ class Tracer(object):
 
     @staticmethod
     def lookup_args_value(name, f, args, kwargs):
-        args_name = inspect.getargspec(f)[0]
+        args_name = getargspec(f)[0]
         args_dict = collections.OrderedDict(
             list(zip(args_name, args)) + list(kwargs.items())
         )
@@ -420,35 +684,248 @@ class Tracer(object):
         return fmt_params
 
     @staticmethod
-    def mk_traced_exc(exc, text_spec, f, args, kwargs):
-        params_map = exc.params()
+    def chain_exc(exc, key, keep_repeats, text=None, params_map=None):
+        """chain_exc - build StackTracerException on top of underlying one
+
+        Args:
+            exc (StackTracerException): underlying exception
+            key (tuple): identifies frame by its template and function, must
+                be picklable as it is kept by StackTracerException
+            keep_repeats (int): number of consecutive frames with the same key
+                kept in full. None disables folding. The first frame of a run
+                is always kept in full, so 0 acts as 1
+            text (str, optional): already formatted description of the frame
+            params_map (dict, optional): values for upper frames lookup
+
+        Returns:
+            StackTracerException to raise. When more than `keep_repeats` + 1
+                consecutive frames share the same key, the extra ones are
+                folded into a single run record instead of growing the chain
+        """
+        if keep_repeats is None or exc.key() != key:
+            return StackTracerException(
+                sub_exc=exc, text=text, params_map=params_map, key=key
+            )
+        if exc.repeats():
+            run_first = exc.run_first()
+            repeats = exc.repeats() + 1
+        elif exc.streak() <= max(keep_repeats, 1):
+            return StackTracerException(
+                sub_exc=exc, text=text, params_map=params_map,
+                key=key, streak=exc.streak() + 1
+            )
+        else:
+            run_first = exc.text()
+            repeats = 2
+        # exc is superseded by the new run record. Link its context straight
+        # to the frame below the run to keep memory bounded while the context
+        # chain still reaches original exception
+        exc.__context__ = exc.sub_exc()
+        return StackTracerException(
+            sub_exc=exc.sub_exc(), text=text, params_map=params_map,
+            key=key, streak=exc.streak() + 1,
+            run_first=run_first, repeats=repeats
+        )
+
+    @staticmethod
+    def annotate_exc(exc, key, keep_repeats, text=None, params_map=None):
+        """annotate_exc - append frame description to exception side record
+
+        Args are the same as for `chain_exc`, text is expected to be already
+        formatted. Instead of building new StackTracerException frame is
+        appended to `__ctxt__` list of AnnotatedFrame attached to exc by
+        `capture_exc` and its text is added to exc notes when supported
+        (Python 3.11+). Repeating frames are folded the same way `chain_exc`
+        does. Caller is expected to reraise exc.
+        """
+        params_map = {} if params_map is None else params_map
+        frames = exc.__ctxt__
+        last = frames[-1] if frames else None
+        if keep_repeats is None or last is None or last.key != key:
+            frame = AnnotatedFrame(text, params_map, key, 1, None, 0)
+        elif last.repeats:
+            frame = last._replace(
+                text=text, params=params_map,
+                streak=last.streak + 1, repeats=last.repeats + 1
+            )
+            frames.pop()
+        elif last.streak <= max(keep_repeats, 1):
+            frame = AnnotatedFrame(
+                text, params_map, key, last.streak + 1, None, 0
+            )
+        else:
+            frame = AnnotatedFrame(text, params_map, key, last.streak + 1,
+                                   last.text, 2)
+            frames.pop()
+        frames.append(frame)
+
+        if not text or not hasattr(exc, 'add_note'):
+            return
+        note = frame.note()
+        if frame.repeats and exc.__notes__ and \
+                exc.__notes__[-1] == last.note():
+            exc.__notes__[-1] = note
+        else:
+            exc.add_note(note)
+
+    @staticmethod
+    def add_frame(exc, key, keep_repeats, text=None, params_map=None):
+        """add_frame - continue exception chain in the mode it was started
+
+        Returns:
+            StackTracerException to raise in place of exc or None when exc
+            is annotated in place and is to be reraised as is
+        """
+        if hasattr(exc, '__ctxt__'):
+            Tracer.annotate_exc(exc, key, keep_repeats, text, params_map)
+            return None
+        return Tracer.chain_exc(exc, key, keep_repeats, text, params_map)
+
+    @staticmethod
+    def format_run(first, last, count):
+        """format_run - single line text of folded run record, used both for
+        exception notes and log records
+        """
+        return '{0} [{1} repeats since: {2}]'.format(last, count, first)
+
+    @staticmethod
+    def format_chain(exc, fmt='dict'):
+        """format_chain - format either StackTracerException or exception
+        annotated in place
+
+        Args:
+            exc (Exception): exception caught
+            fmt (str): format spec, same as for StackTracerException.format
+
+        Returns:
+            Structure of the same shape StackTracerException.format returns.
+            For annotated exceptions the lowest frame text contains original
+            python traceback without notes.
+        """
+        if isinstance(exc, StackTracerException):
+            return exc.format(fmt)
+        assert fmt in ['dict', 'dict-short']
+        s = {'text': Tracer.original_traceback(exc)}
+        for frame in getattr(exc, '__ctxt__', ()):
+            s = frame.format(s)
+        return s
+
+    @staticmethod
+    def original_traceback(exc):
+        """original_traceback - traceback text of exception annotated in
+        place as it was when the exception was captured, without notes
+        """
+        tb = traceback.TracebackException(
+            type(exc), exc, getattr(exc, '__ctxt_tb__', exc.__traceback__)
+        )
+        tb.__notes__ = None
+        return ''.join(tb.format())
+
+    @staticmethod
+    def is_traced(exc):
+        return isinstance(exc, StackTracerException) or \
+            hasattr(exc, '__ctxt__')
+
+    @staticmethod
+    def continues_chain(exc, annotate):
+        """continues_chain - whether exc already carries chain to continue
+
+        StackTracerException chain is always continued. Exception annotated
+        in place is continued by annotating Tracers only, others wrap it as
+        newly caught one.
+        """
+        return isinstance(exc, StackTracerException) or (
+            annotate and hasattr(exc, '__ctxt__')
+        )
+
+    @staticmethod
+    def wrap_exc(exc):
+        """wrap_exc - StackTracerException for just caught exception
+
+        Frames of exception annotated in place by lower Tracers are carried
+        over as StackTracerException sub chain.
+        """
+        frames = getattr(exc, '__ctxt__', None)
+        if frames is None:
+            return StackTracerException(text=traceback.format_exc())
+        sub_exc = StackTracerException(text=Tracer.original_traceback(exc))
+        for frame in frames:
+            sub_exc = StackTracerException(
+                sub_exc=sub_exc, text=frame.text, params_map=frame.params,
+                key=frame.key, streak=frame.streak,
+                run_first=frame.run_first, repeats=frame.repeats
+            )
+        return sub_exc
+
+    @staticmethod
+    def capture_exc(exc, template, stats=None, annotate=False):
+        watch = Stopwatch.start(stats, template)
+        if annotate:
+            exc.__ctxt__ = []
+            exc.__ctxt_tb__ = getattr(exc, '__traceback__', None)
+        else:
+            exc = Tracer.wrap_exc(exc)
+        watch.lap('capture_time')
+        watch.stop(captures=1)
+        return exc
+
+    @staticmethod
+    def exc_params(exc):
+        frames = getattr(exc, '__ctxt__', None)
+        if frames:
+            return frames[-1].params
+        if isinstance(exc, StackTracerException):
+            return exc.params()
+        return {}
+
+    @staticmethod
+    def mk_traced_exc(exc, text_spec, f, args, kwargs, keep_repeats=None,
+                      stats=None):
+        key = (text_spec, f.__module__, getattr(f, '__qualname__', f.__name__))
+        watch = Stopwatch.start(stats, text_spec)
+        params_map = Tracer.exc_params(exc)
         fmt_params = Tracer.gather_params(
             text_spec, params_map,
             lambda name:
                 Tracer.lookup_args_value(name, f, args, kwargs)
         )
+        watch.lap('lookup_time')
         if fmt_params:
             text = text_spec.format(**fmt_params)
-            raise StackTracerException(
-                sub_exc=exc,
-                text=text,
-                params_map={}
-            )
-        raise StackTracerException(sub_exc=exc, text=text_spec)
+            params_map = {}
+        else:
+            text = text_spec
+            params_map = None
+        watch.lap('format_time')
+        exc = Tracer.add_frame(
+            exc, key, keep_repeats,
+            text=text,
+            params_map=params_map
+        )
+        watch.lap('raise_time')
+        watch.stop(levels=1)
+        return exc
 
     @staticmethod
-    def mk_scope_exc(exc, args):
+    def mk_scope_exc(exc, args, keep_repeats=None, stats=None):
         text_spec, params_map = Tracer.parse_args(args)
+        key = (text_spec, ) + Tracer.scope_owner()
+        watch = Stopwatch.start(stats, text_spec)
         if text_spec is None:
-            raise StackTracerException(sub_exc=exc, params_map=params_map)
-
-        fmt_params = Tracer.gather_params(
-            text_spec, params_map,
-            lambda name: Tracer.lookup_stack_value(name)
-        )
-        text_spec = text_spec.format(**fmt_params)
-        raise StackTracerException(
-            sub_exc=exc,
-            text=text_spec,
+            fmt_params = params_map
+        else:
+            fmt_params = Tracer.gather_params(
+                text_spec, params_map,
+                lambda name: Tracer.lookup_stack_value(name)
+            )
+        watch.lap('lookup_time')
+        text = None if text_spec is None else text_spec.format(**fmt_params)
+        watch.lap('format_time')
+        exc = Tracer.add_frame(
+            exc, key, keep_repeats,
+            text=text,
             params_map=fmt_params
         )
+        watch.lap('raise_time')
+        watch.stop(levels=1)
+        return exc
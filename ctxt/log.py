@@ -0,0 +1,137 @@
+"""
+Ctxt logging integration
+
+Attaches semantic exception context to logging records and renders it only
+when a handler actually emits the record. Rendering result is cached on the
+record, so several handlers emitting the same record format it just once.
+
+Example:
+    >> handler = logging.StreamHandler()
+    >> handler.addFilter(ContextFilter())
+    >> handler.setFormatter(ContextFormatter('%(levelname)s %(message)s'))
+    >> logging.getLogger().addHandler(handler)
+    >>
+    >> try:
+    >>     do_some_staff()
+    >> except StackTracerException:
+    >>     logging.exception('Failed to do some staff')
+
+    Structured handlers may use `record.ctxt.format('dict')` instead.
+"""
+
+
+import json
+import logging
+
+from ctxt.ctxt import Tracer
+
+
+class LogContext(object):
+    """ LogContext - lazily rendered semantic context of logged exception
+
+    Nothing is formatted on construction. Both structured and textual
+    representations are formatted on first access and cached. Pickled
+    context carries formatted structure only, not the live exception, so
+    records stay picklable for SocketHandler and QueueHandler.
+    """
+
+    def __init__(self, exc):
+        self.__exc = exc
+        self.__dict = None
+        self.__text = None
+        self.__json = None
+
+    @classmethod
+    def rendered(cls, s):
+        """rendered - construct context from already formatted structure"""
+        context = cls(None)
+        context.__dict = s
+        return context
+
+    def __reduce__(self):
+        return (LogContext.rendered, (self.format('dict'), ))
+
+    @classmethod
+    def from_record(cls, record):
+        """from_record - get context attached to record, attach if missing
+
+        Returns:
+            LogContext instance or None when record has no traced exception
+        """
+        context = getattr(record, 'ctxt', None)
+        if context is not None:
+            return context
+        exc = record.exc_info[1] if record.exc_info else None
+        if exc is None or not Tracer.is_traced(exc):
+            return None
+        record.ctxt = cls(exc)
+        return record.ctxt
+
+    def format(self, fmt='dict'):
+        assert fmt in ['dict', 'dict-short']
+        if self.__dict is None:
+            self.__dict = Tracer.format_chain(self.__exc, fmt)
+        return self.__dict
+
+    def __str__(self):
+        if self.__text is None:
+            lines = []
+            s = self.format('dict')
+            while s:
+                run = s.get('run')
+                if run:
+                    lines.append(Tracer.format_run(**run))
+                elif s.get('text'):
+                    lines.append(s['text'].rstrip('\n'))
+                s = s.get('sub_exc')
+            self.__text = '\n'.join(lines)
+        return self.__text
+
+    def to_json(self):
+        if self.__json is None:
+            self.__json = json.dumps(self.format('dict'))
+        return self.__json
+
+
+class ContextFilter(logging.Filter):
+    """ContextFilter - attaches LogContext to records with traced exception
+
+    Context is available as `ctxt` record attribute. Filter never drops
+    records and renders nothing itself.
+    """
+
+    def filter(self, record):
+        LogContext.from_record(record)
+        return True
+
+
+class ContextFormatter(logging.Formatter):
+    """ContextFormatter - formats semantic context in place of traceback
+
+    Args are the same as for logging.Formatter except:
+        ctxt_format (str, optional): 'text' (default) renders frame texts line
+            by line from the top stack frame, 'json' renders
+            `format('dict')` structure as JSON
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.__ctxt_format = kwargs.pop('ctxt_format', 'text')
+        assert self.__ctxt_format in ['text', 'json']
+        super(ContextFormatter, self).__init__(*args, **kwargs)
+
+    def format(self, record):
+        context = LogContext.from_record(record)
+        if context is None:
+            return super(ContextFormatter, self).format(record)
+        if self.__ctxt_format == 'json':
+            text = context.to_json()
+        else:
+            text = str(context)
+        # Substitute traceback just for this formatter, other handlers still
+        # see original record exc_text
+        exc_text = record.exc_text
+        record.exc_text = text
+        try:
+            return super(ContextFormatter, self).format(record)
+        finally:
+            record.exc_text = exc_text
@@ -0,0 +1 @@
+{"text": "Walking 5", "run": {"first": "Walking 2", "last": "Walking 5", "count": 4}, "sub_exc": {"text": "Walking 1", "sub_exc": {"text": "Walking 0", "sub_exc": {"text": "Exception Traceback goes here"}}}}
\ No newline at end of file
@@ -0,0 +1 @@
+{"text": "Walking 2", "sub_exc": {"text": "Walking 1", "sub_exc": {"text": "Walking 0", "sub_exc": {"text": "Exception Traceback goes here"}}}}
\ No newline at end of file
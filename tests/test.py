@@ -1,5 +1,8 @@
 import sys
 import json
+import pickle
+import logging
+import logging.handlers
 import unittest
 import ctxt
 
@@ -14,6 +17,21 @@ class TracerKeyError(ctxt.Tracer):
 tracer = ctxt.Tracer()
 tracer1 = ctxt.Tracer(throws=(KeyError, ))
 tracer2 = TracerKeyError()
+tracer3 = ctxt.Tracer(keep_repeats=2)
+stats = ctxt.TracerStats()
+tracer4 = ctxt.Tracer(stats=stats)
+tracer5 = ctxt.Tracer(annotate=True, keep_repeats=2)
+annotate_stats = ctxt.TracerStats()
+tracer6 = ctxt.Tracer(annotate=True, stats=annotate_stats)
+tracer7 = ctxt.Tracer(annotate=True, throws=(KeyError, ))
+
+
+class TracerAnnotate(ctxt.Tracer):
+    annotate = True
+
+
+class TracerRepeats(ctxt.Tracer):
+    keep_repeats = 1
 
 
 class DoSomeStuff1(object):
@@ -132,8 +150,140 @@ class DoSomeStuff2(object):
             self.process_2_1(v1, v2)
 
 
+class DoSomeStuff3(object):
+    @tracer3.traced('Walking {depth}')
+    def walk_1(self, depth):
+        if depth:
+            return self.walk_1(depth - 1)
+        a = {1: 2}
+        str(a[3])
+
+    @TracerRepeats.traced('Walking {depth}')
+    def walk_2(self, depth):
+        if depth:
+            return self.walk_2(depth - 1)
+        a = {1: 2}
+        str(a[3])
+
+    @tracer3.traced('Walking {depth}')
+    def walk_3(self, depth):
+        if depth:
+            with tracer3.scope('depth={depth}'):
+                return self.walk_3(depth - 1)
+        a = {1: 2}
+        str(a[3])
+
+    @tracer.traced('Walking {depth}')
+    def walk_4(self, depth):
+        if depth:
+            return self.walk_4(depth - 1)
+        a = {1: 2}
+        str(a[3])
+
+    @tracer3.traced('Nesting {value}')
+    def nest(self, value):
+        with tracer3.scope('value={value}'):
+            with tracer3.scope('value={value}'):
+                with tracer3.scope('value={value}'):
+                    with tracer3.scope('value={value}'):
+                        [][0]
+
+    def load_project(self, name):
+        with TracerRepeats.scope('Loading {name}'):
+            self.load_file(name + '/main.py')
+
+    def load_file(self, name):
+        with TracerRepeats.scope('Loading {name}'):
+            [][0]
+
+
+class DoSomeStuff4(object):
+    @tracer4.traced('Adding {v1} and {v2}')
+    def process_1(self, v1, v2):
+        with tracer4.scope("v1={v1}, v2={v2}"):
+            a = {1: 2}
+            str(a[3])
+
+    @tracer4.traced('No text')
+    def process_2(self):
+        with tracer4.scope({'v': 1}):
+            [][0]
+
+
+class DoSomeStuff5(object):
+    @tracer5.traced('Adding {v1} and {v2}')
+    def process_1(self, v1, v2):
+        a = {1: 2}
+        str(a[3])
+
+    @tracer5.traced('Adding {v1} and {v2}')
+    def process_2_2(self, v1, v2):
+        with tracer5.scope("v1={v1}, v2={v2}", {'v1': v1, 'v2': v2}):
+            with tracer5.scope("v1={v1}, v2={v2}"):
+                a = {1: 2}
+                str(a[3])
+
+    @TracerAnnotate.traced('Adding {v1} and {v2}')
+    def process_3_1(self, v1, v2):
+        d2.process_1_1(v1, v2)
+
+    @TracerAnnotate.traced('Adding {v1} and {v2}')
+    def process_4(self, v1, v2):
+        with TracerAnnotate.scope("v1={v1}, v2={v2}"):
+            self.process_2_1(v1, v2)
+
+    @TracerAnnotate.traced('Adding {v1} and {v2}')
+    def process_2_1(self, v1, v2):
+        with TracerAnnotate.scope("v1={v1}, v2={v2}"):
+            with TracerAnnotate.scope("v1={v1}, v2={v2}"):
+                a = {1: 2}
+                str(a[3])
+
+    @tracer5.traced('Walking {depth}')
+    def walk_1(self, depth):
+        if depth:
+            return self.walk_1(depth - 1)
+        a = {1: 2}
+        str(a[3])
+
+
+class DoSomeStuff6(object):
+    @tracer6.traced('Outer {v}')
+    def outer(self, v):
+        self.inner(v)
+
+    @tracer6.traced('Inner {v}')
+    def inner(self, v):
+        with tracer6.scope('v={v}'):
+            [][0]
+
+    @tracer.traced('Wrapped {v}')
+    def wrapped(self, v):
+        self.inner(v)
+
+    @tracer1.traced('Wrapped {v}')
+    def wrapped_throws(self, v):
+        self.key_error(v)
+
+    @tracer7.traced('Throws {v}')
+    def throws(self, v):
+        self.inner(v)
+
+    @tracer7.traced('Throws {v}')
+    def throws_key_error(self, v):
+        self.key_error(v)
+
+    @tracer6.traced('Key error {v}')
+    def key_error(self, v):
+        {}[v]
+
+
 d1 = DoSomeStuff1()
 d2 = DoSomeStuff2()
+d3 = DoSomeStuff3()
+d4 = DoSomeStuff4()
+d5 = DoSomeStuff5()
+d6 = DoSomeStuff6()
 
 
 class TestCase(unittest.TestCase):
@@ -154,14 +304,325 @@ class TestCase(unittest.TestCase):
             expected = json.load(f)
         try:
             self.__method(*self.__args, **self.__kwargs)
-        except ctxt.StackTracerException as e:
+        except Exception as e:
             exc = e
         self.assertEqual(
             expected,
-            sanitize_traceback(exc.format('dict'))
+            sanitize_traceback(ctxt.Tracer.format_chain(exc, 'dict'))
         )
 
 
+class RepeatsTestCase(unittest.TestCase):
+    def test_pickle(self):
+        for method, args in ((d3.walk_1, (5, )), (d1.process_4, (1, 2))):
+            try:
+                method(*args)
+            except ctxt.StackTracerException as e:
+                exc = e
+            restored = pickle.loads(pickle.dumps(exc))
+            self.assertEqual(restored.format('dict'), exc.format('dict'))
+
+    def test_braces(self):
+        with self.assertRaises(ctxt.StackTracerException) as cm:
+            d3.nest({'a': 1})
+        d = sanitize_traceback(cm.exception.format('dict'))
+        text = "value={'a': 1}"
+        self.assertEqual(d['text'], "Nesting {'a': 1}")
+        self.assertEqual(
+            d['sub_exc']['run'], {'first': text, 'last': text, 'count': 2}
+        )
+        self.assertEqual(d['sub_exc']['sub_exc']['text'], text)
+
+    def test_context(self):
+        with self.assertRaises(ctxt.StackTracerException) as cm:
+            d3.walk_2(5)
+        chain = []
+        exc = cm.exception
+        while exc is not None:
+            chain.append(exc)
+            exc = exc.__context__
+        self.assertTrue(isinstance(chain[-1], KeyError))
+        self.assertTrue(len(chain) < 6)
+
+    def test_single_repeat(self):
+        with self.assertRaises(ctxt.StackTracerException) as cm:
+            d3.walk_2(1)
+        self.assertEqual(
+            sanitize_traceback(cm.exception.format('dict')),
+            {
+                'text': 'Walking 1',
+                'sub_exc': {
+                    'text': 'Walking 0',
+                    'sub_exc': {'text': 'Exception Traceback goes here'}
+                }
+            }
+        )
+
+    def test_scope_owner(self):
+        with self.assertRaises(ctxt.StackTracerException) as cm:
+            d3.load_project('proj')
+        self.assertEqual(
+            sanitize_traceback(cm.exception.format('dict')),
+            {
+                'text': 'Loading proj',
+                'sub_exc': {
+                    'text': 'Loading proj/main.py',
+                    'sub_exc': {'text': 'Exception Traceback goes here'}
+                }
+            }
+        )
+
+
+class StatsTestCase(unittest.TestCase):
+    def test_stats(self):
+        stats.reset()
+        for _ in range(2):
+            with self.assertRaises(ctxt.StackTracerException):
+                d4.process_1(1, 2)
+        s = stats.snapshot(reset=True)
+        self.assertEqual(
+            sorted(s.keys()),
+            sorted(['Adding {v1} and {v2}', 'v1={v1}, v2={v2}'])
+        )
+        self.assertEqual(s['v1={v1}, v2={v2}']['captures'], 2)
+        self.assertEqual(s['v1={v1}, v2={v2}']['levels'], 2)
+        self.assertEqual(s['Adding {v1} and {v2}']['captures'], 0)
+        self.assertEqual(s['Adding {v1} and {v2}']['levels'], 2)
+        for counters in s.values():
+            self.assertEqual(
+                sorted(counters.keys()), sorted(ctxt.TracerStats.fields)
+            )
+            for field in ctxt.TracerStats.fields:
+                self.assertTrue(counters[field] >= 0)
+        self.assertEqual(stats.snapshot(), {})
+
+    def test_no_stats(self):
+        stats.reset()
+        calls = []
+        timer = ctxt.ctxt.timer
+        ctxt.ctxt.timer = lambda: calls.append(1) or timer()
+        try:
+            with self.assertRaises(ctxt.StackTracerException):
+                d1.process_1_1(1, 2)
+        finally:
+            ctxt.ctxt.timer = timer
+        self.assertEqual(stats.snapshot(), {})
+        self.assertEqual(calls, [])
+
+    def test_no_template(self):
+        stats.reset()
+        with self.assertRaises(ctxt.StackTracerException):
+            d4.process_2()
+        s = stats.snapshot(reset=True)
+        self.assertEqual(sorted(s.keys()), ['<scope>', 'No text'])
+        self.assertEqual(s['<scope>']['captures'], 1)
+
+
+class AnnotateTestCase(unittest.TestCase):
+    def test_type_kept(self):
+        with self.assertRaises(KeyError) as cm:
+            d5.process_2_2(1, 2)
+        self.assertFalse(isinstance(cm.exception, ctxt.StackTracerException))
+        if hasattr(cm.exception, 'add_note'):
+            self.assertEqual(
+                cm.exception.__notes__,
+                ['v1=1, v2=2', 'v1=1, v2=2', 'Adding 1 and 2']
+            )
+
+    def test_traceback(self):
+        try:
+            d5.process_1(1, 2)
+        except KeyError as e:
+            text = ctxt.Tracer.format_chain(e)['sub_exc']['text']
+        self.assertTrue(text.startswith('Traceback'))
+        self.assertTrue(text.endswith('KeyError: 3\n'))
+
+    def test_braces(self):
+        with self.assertRaises(IndexError) as cm:
+            d6.inner({'a': 1})
+        self.assertEqual(
+            ctxt.Tracer.format_chain(cm.exception)['sub_exc']['text'],
+            "v={'a': 1}"
+        )
+        if hasattr(cm.exception, 'add_note'):
+            self.assertEqual(
+                cm.exception.__notes__, ["v={'a': 1}", "Inner {'a': 1}"]
+            )
+
+    def test_captures(self):
+        annotate_stats.reset()
+        with self.assertRaises(IndexError):
+            d6.outer(1)
+        s = annotate_stats.snapshot()
+        self.assertEqual(sum(c['captures'] for c in s.values()), 1)
+        self.assertEqual(sum(c['levels'] for c in s.values()), 3)
+
+    def test_wrapped(self):
+        with self.assertRaises(ctxt.StackTracerException) as cm:
+            d6.wrapped(1)
+        d = sanitize_traceback(ctxt.Tracer.format_chain(cm.exception))
+        self.assertEqual(
+            d,
+            {
+                'text': 'Wrapped 1',
+                'sub_exc': {
+                    'text': 'Inner 1',
+                    'sub_exc': {
+                        'text': 'v=1',
+                        'sub_exc': {'text': 'Exception Traceback goes here'}
+                    }
+                }
+            }
+        )
+
+    def test_wrapped_throws(self):
+        with self.assertRaises(KeyError) as cm:
+            d6.wrapped_throws(1)
+        self.assertEqual(
+            ctxt.Tracer.format_chain(cm.exception)['text'], 'Key error 1'
+        )
+
+    def test_throws(self):
+        with self.assertRaises(IndexError) as cm:
+            d6.throws(1)
+        self.assertEqual(
+            ctxt.Tracer.format_chain(cm.exception)['text'], 'Throws 1'
+        )
+        with self.assertRaises(KeyError) as cm:
+            d6.throws_key_error(1)
+        self.assertEqual(
+            ctxt.Tracer.format_chain(cm.exception)['text'], 'Throws 1'
+        )
+
+    def test_repeats_notes(self):
+        with self.assertRaises(KeyError) as cm:
+            d5.walk_1(5)
+        if hasattr(cm.exception, 'add_note'):
+            self.assertEqual(
+                cm.exception.__notes__,
+                [
+                    'Walking 0', 'Walking 1',
+                    'Walking 5 [4 repeats since: Walking 2]'
+                ]
+            )
+
+
+class ListHandler(logging.Handler):
+    def __init__(self, level=logging.NOTSET):
+        super(ListHandler, self).__init__(level)
+        self.records = []
+        self.lines = []
+
+    def emit(self, record):
+        self.records.append(record)
+        self.lines.append(self.format(record))
+
+
+class LoggingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger('ctxt.test')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+        self.text = ListHandler()
+        self.text.addFilter(ctxt.ContextFilter())
+        self.text.setFormatter(ctxt.ContextFormatter('%(message)s'))
+        self.json = ListHandler()
+        self.json.setFormatter(
+            ctxt.ContextFormatter('%(message)s', ctxt_format='json')
+        )
+        self.plain = ListHandler(logging.ERROR)
+        self.plain.addFilter(ctxt.ContextFilter())
+        for h in (self.text, self.json, self.plain):
+            self.logger.addHandler(h)
+
+    def tearDown(self):
+        for h in (self.text, self.json, self.plain):
+            self.logger.removeHandler(h)
+
+    def log_exception(self, method, level=logging.ERROR):
+        try:
+            method(1, 2)
+        except Exception:
+            self.logger.log(level, 'failed', exc_info=True)
+
+    def test_text(self):
+        self.log_exception(d1.process_3_1)
+        lines = self.text.lines[0].split('\n')
+        self.assertEqual(
+            lines[:5],
+            [
+                'failed', 'Adding 1 and 2', 'Adding 1 and 2', 'v1=1, v2=2',
+                'Traceback (most recent call last):'
+            ]
+        )
+        self.assertEqual(lines[-1], 'KeyError: 3')
+
+    def test_json(self):
+        self.log_exception(d5.process_1)
+        message, text = self.json.lines[0].split('\n', 1)
+        self.assertEqual(message, 'failed')
+        with open('tests/d1.process_1.js') as f:
+            self.assertEqual(
+                json.load(f), sanitize_traceback(json.loads(text))
+            )
+
+    def test_cached(self):
+        self.log_exception(d1.process_1)
+        record = self.text.records[0]
+        self.assertTrue(record is self.json.records[0])
+        self.assertTrue(record is self.plain.records[0])
+        self.assertTrue(isinstance(record.ctxt, ctxt.LogContext))
+        self.assertTrue(str(record.ctxt) is str(record.ctxt))
+        self.assertTrue(
+            record.ctxt.format('dict') is record.ctxt.format('dict')
+        )
+        self.assertTrue(
+            self.plain.lines[0].startswith('failed\nTraceback')
+        )
+
+    def test_suppressed(self):
+        self.logger.setLevel(logging.INFO)
+        self.log_exception(d1.process_1, logging.DEBUG)
+        self.logger.setLevel(logging.DEBUG)
+        self.log_exception(d1.process_1, logging.WARNING)
+        self.assertEqual(len(self.text.records), 1)
+        self.assertEqual(self.plain.records, [])
+
+    def test_run(self):
+        try:
+            d5.walk_1(5)
+        except KeyError as e:
+            exc = e
+            self.logger.error('failed', exc_info=True)
+        lines = self.text.lines[0].split('\n')
+        self.assertEqual(lines[1], 'Walking 5 [4 repeats since: Walking 2]')
+        if hasattr(exc, 'add_note'):
+            self.assertEqual(lines[1], exc.__notes__[-1])
+
+    def test_pickle(self):
+        try:
+            with tracer.scope('f={f}', {'f': lambda: None}):
+                [][0]
+        except ctxt.StackTracerException:
+            self.logger.error('failed', exc_info=True)
+        record = self.text.records[0]
+        data = logging.handlers.SocketHandler('localhost', None).makePickle(
+            record
+        )
+        restored = pickle.loads(data[4:])['ctxt']
+        self.assertEqual(restored.format('dict'), record.ctxt.format('dict'))
+        self.assertEqual(str(restored), str(record.ctxt))
+
+    def test_not_traced(self):
+        try:
+            {}[1]
+        except KeyError:
+            self.logger.error('failed', exc_info=True)
+        record = self.text.records[0]
+        self.assertFalse(hasattr(record, 'ctxt'))
+        self.assertTrue('KeyError: 1' in self.text.lines[0])
+
+
 def sanitize_traceback(d):
     for k, v in d.items():
         if isinstance(v, str):
@@ -181,6 +642,11 @@ def suite(test_list):
             item['file']
         )
         for item in test_list
+    ] + [
+        unittest.defaultTestLoader.loadTestsFromTestCase(case)
+        for case in (
+            RepeatsTestCase, StatsTestCase, AnnotateTestCase, LoggingTestCase
+        )
     ])
 
 
@@ -192,10 +658,10 @@ def gen_files(test_list):
         json_file = t['file']
         try:
             method(*args, **kwargs)
-        except ctxt.StackTracerException as e:
+        except Exception as e:
             with open(json_file, 'w') as f:
                 json.dump(
-                    sanitize_traceback(e.format('dict')),
+                    sanitize_traceback(ctxt.Tracer.format_chain(e, 'dict')),
                     f
                 )
 
@@ -224,10 +690,26 @@ test_list = [
     {'method': d2.process_3_3, 'args': (1, 2), 'file': 'tests/d2.process_3_3.js'},
     {'method': d2.process_3_4, 'args': (1, 2), 'file': 'tests/d2.process_3_4.js'},
     {'method': d2.process_4, 'args': (1, 2), 'file': 'tests/d2.process_4.js'},
+
+    {'method': d3.walk_1, 'args': (5, ), 'file': 'tests/d3.walk_1.js'},
+    {'method': d3.walk_1, 'args': (1, ), 'file': 'tests/d3.walk_1_1.js'},
+    {'method': d3.walk_1, 'args': (300, ), 'file': 'tests/d3.walk_1_2.js'},
+    {'method': d3.walk_2, 'args': (5, ), 'file': 'tests/d3.walk_2.js'},
+    {'method': d3.walk_3, 'args': (2, ), 'file': 'tests/d3.walk_3.js'},
+    {'method': d3.walk_4, 'args': (2, ), 'file': 'tests/d3.walk_4.js'},
+]
+
+# Annotate mode is expected to match wrapping mode fixtures, never generated
+annotate_test_list = [
+    {'method': d5.process_1, 'args': (1, 2), 'file': 'tests/d1.process_1.js'},
+    {'method': d5.process_2_2, 'args': (1, 2), 'file': 'tests/d1.process_2_2.js'},
+    {'method': d5.process_3_1, 'args': (1, 2), 'file': 'tests/d1.process_3_1.js'},
+    {'method': d5.process_4, 'args': (1, 2), 'file': 'tests/d1.process_4.js'},
+    {'method': d5.walk_1, 'args': (5, ), 'file': 'tests/d3.walk_1.js'},
 ]
 
 if __name__ == '__main__':
     if len(sys.argv) == 1:
-        unittest.TextTestRunner().run(suite(test_list))
+        unittest.TextTestRunner().run(suite(test_list + annotate_test_list))
     else:
         gen_files(test_list)